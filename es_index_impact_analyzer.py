@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 import argparse
+import functools
+import heapq
+import io
 import json
+import math
+import operator
 import re
 import ssl
 import sys
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
 
 import requests
 import urllib3
 from urllib3.util import ssl_ as urllib3_ssl
 from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 DEFAULT_INDEX_PATTERN = r"^logstash-(.+)-\d+$"
 DEFAULT_WEIGHTS = {
@@ -19,31 +31,89 @@ DEFAULT_WEIGHTS = {
     "fielddata_mb": 2.0,
     "query_cache_mb": 0.5,
 }
+BYTES_PER_GB = 1024 ** 3
+BYTES_PER_MB = 1024 ** 2
 WEIGHTED_METRICS = {
-    "total_storage_gb": "storage_gb",
-    "total_shards": "shard_count",
-    "total_segments": "segment_count",
-    "fielddata_mb": "fielddata_mb",
-    "query_cache_mb": "query_cache_mb",
+    "total_store_bytes": ("storage_gb", BYTES_PER_GB),
+    "total_shards": ("shard_count", 1),
+    "total_segments": ("segment_count", 1),
+    "fielddata_bytes": ("fielddata_mb", BYTES_PER_MB),
+    "query_cache_bytes": ("query_cache_mb", BYTES_PER_MB),
 }
 HEAP_USAGE_KEYS = (
-    "segment_memory_mb",
-    "fielddata_mb",
-    "query_cache_mb",
-    "request_cache_mb",
+    "segment_memory_bytes",
+    "fielddata_bytes",
+    "query_cache_bytes",
+    "request_cache_bytes",
+)
+INDEX_STAT_PATHS = {
+    "primary_store_bytes": "primaries.store.size_in_bytes",
+    "doc_count": "primaries.docs.count",
+    "total_store_bytes": "total.store.size_in_bytes",
+    "total_segments": "total.segments.count",
+    "segment_memory_bytes": "total.segments.memory_in_bytes",
+    "fielddata_bytes": "total.fielddata.memory_size_in_bytes",
+    "query_cache_bytes": "total.query_cache.memory_size_in_bytes",
+    "request_cache_bytes": "total.request_cache.memory_size_in_bytes",
+}
+ALL_STAT_FIELDS = frozenset(INDEX_STAT_PATHS)
+DATA_ROLES = frozenset(
+    ("data", "data_hot", "data_warm", "data_cold", "data_frozen", "data_content")
 )
 CLUSTER_COST = 1000.0
 REPORT_WIDTH = 80
 NAME_WIDTH = 40
+NORMALIZED_ROW_FORMAT = f"{{:<{NAME_WIDTH}}} {{:>10.4f}} {{:>10}} {{:>8d}} {{:>8d}}\n"
+WEIGHTED_ROW_FORMAT = f"{{:<{NAME_WIDTH}}} {{:>10.2f}} {{:>10}} {{:>8d}} {{:>8d}}\n"
+BREAKDOWN_ROW_FORMAT = f"{{:<{NAME_WIDTH}}} {{:>8.2f}}% {{:>20.2f}}\n"
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 4
+RETRY_STATUSES = (502, 503, 504)
 _URLLIB3_SSL_PATCHED = False
 
 
+class GroupMetrics:
+    __slots__ = (
+        "primary_store_bytes",
+        "total_store_bytes",
+        "doc_count",
+        "total_shards",
+        "total_segments",
+        "segment_memory_bytes",
+        "fielddata_bytes",
+        "query_cache_bytes",
+        "request_cache_bytes",
+    )
+
+    def __init__(
+        self,
+        primary_store_bytes: int = 0,
+        total_store_bytes: int = 0,
+        doc_count: int = 0,
+        total_shards: int = 0,
+        total_segments: int = 0,
+        segment_memory_bytes: int = 0,
+        fielddata_bytes: int = 0,
+        query_cache_bytes: int = 0,
+        request_cache_bytes: int = 0,
+    ) -> None:
+        self.primary_store_bytes = primary_store_bytes
+        self.total_store_bytes = total_store_bytes
+        self.doc_count = doc_count
+        self.total_shards = total_shards
+        self.total_segments = total_segments
+        self.segment_memory_bytes = segment_memory_bytes
+        self.fielddata_bytes = fielddata_bytes
+        self.query_cache_bytes = query_cache_bytes
+        self.request_cache_bytes = request_cache_bytes
+
+
 class InsecureHTTPSAdapter(HTTPAdapter):
-    def __init__(self) -> None:
+    def __init__(self, **kwargs: Any) -> None:
         self._ssl_context = ssl.create_default_context()
         self._ssl_context.check_hostname = False
         self._ssl_context.verify_mode = ssl.CERT_NONE
-        super().__init__()
+        super().__init__(**kwargs)
 
     def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
         pool_kwargs["ssl_context"] = self._ssl_context
@@ -54,13 +124,33 @@ class InsecureHTTPSAdapter(HTTPAdapter):
         return super().proxy_manager_for(proxy, **proxy_kwargs)
 
 
+def adapter_options() -> Dict[str, Any]:
+    return {
+        "pool_connections": POOL_CONNECTIONS,
+        "pool_maxsize": POOL_MAXSIZE,
+        "max_retries": Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        ),
+    }
+
+
+def configure_session(session: requests.Session) -> None:
+    adapter = HTTPAdapter(**adapter_options())
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip"
+
+
 def apply_insecure_tls(session: requests.Session) -> None:
     global _URLLIB3_SSL_PATCHED
 
     session.verify = False
     session.trust_env = False
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-    session.mount("https://", InsecureHTTPSAdapter())
+    session.mount("https://", InsecureHTTPSAdapter(**adapter_options()))
 
     if not _URLLIB3_SSL_PATCHED:
         original = urllib3_ssl.create_urllib3_context
@@ -75,6 +165,16 @@ def apply_insecure_tls(session: requests.Session) -> None:
         _URLLIB3_SSL_PATCHED = True
 
 
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value!r}")
+    return number
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Analyze Elasticsearch index impact for billing.")
@@ -90,7 +190,7 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("--json", action="store_true", help="Output JSON")
     parser.add_argument("-o", "--output", help="Write output to a file")
-    parser.add_argument("--top", type=int, help="Show only top consumers")
+    parser.add_argument("--top", type=positive_int, help="Show only top consumers")
     parser.add_argument(
         "--index-pattern",
         default=DEFAULT_INDEX_PATTERN,
@@ -105,6 +205,14 @@ def parse_args() -> argparse.Namespace:
         default="normalized",
         help="Scoring mode: normalized (default, cluster capacity) or weighted.",
     )
+    parser.add_argument(
+        "--allocated-shards",
+        action="store_true",
+        help=(
+            "Count allocated shard copies from /_stats (level=shards) instead of "
+            "configured primaries x (1 + replicas) from /_settings."
+        ),
+    )
 
     parser.add_argument(
         "--weight-storage",
@@ -140,23 +248,49 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def decode_json(payload: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def encode_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+    return json.dumps(payload, indent=2, ensure_ascii=False).encode("utf-8")
+
+
 def request_json(
     session: requests.Session, url: str, params: Dict[str, str], verify: bool
 ) -> Dict[str, Any]:
-    response = session.get(url, params=params, timeout=30, verify=verify)
-    response.raise_for_status()
-    return response.json()
+    with session.get(url, params=params, timeout=30, verify=verify, stream=True) as response:
+        response.raise_for_status()
+        try:
+            payload = response.raw.read(decode_content=True)
+        except urllib3.exceptions.HTTPError as exc:
+            raise requests.ConnectionError(exc, response=response) from exc
+
+    try:
+        return decode_json(payload)
+    except ValueError as exc:
+        raise requests.exceptions.InvalidJSONError(
+            f"Invalid JSON response from {url}: {exc}", response=response
+        ) from exc
 
 
 def bytes_to_gb(value: float) -> float:
-    return value / (1024 ** 3)
+    return value / BYTES_PER_GB
 
 
 def bytes_to_mb(value: float) -> float:
-    return value / (1024 ** 2)
+    return value / BYTES_PER_MB
 
 
 def to_int(value: Any) -> int:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdecimal():
+        return int(value)
     try:
         return int(value)
     except (TypeError, ValueError):
@@ -164,12 +298,10 @@ def to_int(value: Any) -> int:
 
 
 def is_data_node(roles: List[str]) -> bool:
-    if not roles:
-        return True
-    return any(role == "data" or role.startswith("data_") for role in roles)
+    return not roles or not DATA_ROLES.isdisjoint(roles)
 
 
-def fetch_cluster_info(session: requests.Session, base_url: str, verify: bool) -> Dict[str, float]:
+def fetch_cluster_info(session: requests.Session, base_url: str, verify: bool) -> Dict[str, int]:
     stats = request_json(
         session,
         f"{base_url}/_nodes/stats/jvm,fs",
@@ -191,16 +323,23 @@ def fetch_cluster_info(session: requests.Session, base_url: str, verify: bool) -
         if not is_data_node(roles):
             continue
         data_nodes += 1
-        heap_max_bytes += node.get("jvm", {}).get("mem", {}).get("heap_max_in_bytes", 0)
-        disk_total_bytes += node.get("fs", {}).get("total", {}).get("total_in_bytes", 0)
+        try:
+            heap_max_bytes += node["jvm"]["mem"]["heap_max_in_bytes"]
+        except (KeyError, TypeError):
+            pass
+        try:
+            disk_total_bytes += node["fs"]["total"]["total_in_bytes"]
+        except (KeyError, TypeError):
+            pass
 
     return {
-        "disk_total_gb": bytes_to_gb(disk_total_bytes),
-        "heap_max_mb": bytes_to_mb(heap_max_bytes),
+        "disk_total_bytes": disk_total_bytes,
+        "heap_max_bytes": heap_max_bytes,
         "data_nodes": data_nodes,
     }
 
 
+@functools.lru_cache(maxsize=16)
 def parse_auto_expand(value: str) -> Tuple[int, Optional[int]]:
     parts = value.split("-", 1)
     if len(parts) != 2:
@@ -213,6 +352,10 @@ def parse_auto_expand(value: str) -> Tuple[int, Optional[int]]:
 
 
 def parse_replicas(value: Any, auto_expand: Any, data_nodes: int) -> int:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdecimal():
+        return int(value)
     if value is None:
         value = ""
     try:
@@ -245,47 +388,35 @@ def needs_data_nodes(settings: Dict[str, Any]) -> bool:
     return False
 
 
-def collect_index_metrics(
-    stats: Dict[str, Any], settings: Dict[str, Any], data_nodes: int
-) -> List[Dict[str, Any]]:
-    metrics: List[Dict[str, Any]] = []
-    for index_name, index_stats in stats.get("indices", {}).items():
-        primaries = index_stats.get("primaries", {})
-        total = index_stats.get("total", {})
-
-        primary_store_bytes = primaries.get("store", {}).get("size_in_bytes", 0)
-        total_store_bytes = total.get("store", {}).get("size_in_bytes", 0)
-        doc_count = primaries.get("docs", {}).get("count", 0)
-        segment_count = total.get("segments", {}).get("count", 0)
-        segment_memory_bytes = total.get("segments", {}).get("memory_in_bytes", 0)
-        fielddata_bytes = total.get("fielddata", {}).get("memory_size_in_bytes", 0)
-        query_cache_bytes = total.get("query_cache", {}).get("memory_size_in_bytes", 0)
-        request_cache_bytes = total.get("request_cache", {}).get("memory_size_in_bytes", 0)
-
-        settings_index = settings.get(index_name, {}).get("settings", {}).get("index", {})
-        num_shards = to_int(settings_index.get("number_of_shards"))
-        num_replicas = parse_replicas(
-            settings_index.get("number_of_replicas"),
-            settings_index.get("auto_expand_replicas"),
-            data_nodes,
-        )
-        shard_count = num_shards * (1 + num_replicas)
+def required_stat_fields(score_mode: str, detailed: bool) -> FrozenSet[str]:
+    if detailed:
+        return ALL_STAT_FIELDS
+    fields = ALL_STAT_FIELDS - {"primary_store_bytes", "doc_count"}
+    if score_mode == "weighted":
+        fields -= {"request_cache_bytes"}
+    return fields
 
-        metrics.append(
-            {
-                "name": index_name,
-                "primary_storage_gb": bytes_to_gb(primary_store_bytes),
-                "total_storage_gb": bytes_to_gb(total_store_bytes),
-                "doc_count": doc_count,
-                "total_shards": shard_count,
-                "total_segments": segment_count,
-                "segment_memory_mb": bytes_to_mb(segment_memory_bytes),
-                "fielddata_mb": bytes_to_mb(fielddata_bytes),
-                "query_cache_mb": bytes_to_mb(query_cache_bytes),
-                "request_cache_mb": bytes_to_mb(request_cache_bytes),
-            }
-        )
-    return metrics
+
+def index_stats_params(fields: FrozenSet[str], allocated_shards: bool = False) -> Dict[str, str]:
+    paths = [path for field, path in INDEX_STAT_PATHS.items() if field in fields]
+    metrics = dict.fromkeys(path.split(".")[1] for path in paths)
+    if allocated_shards:
+        paths.append("shards.*.routing.primary")
+    return {
+        "metric": ",".join(metrics),
+        "level": "shards" if allocated_shards else "indices",
+        "filter_path": ",".join(f"indices.*.{path}" for path in paths),
+    }
+
+
+def read_index_stats(index_stats: Dict[str, Any]) -> Dict[str, int]:
+    values = {}
+    for field, path in INDEX_STAT_PATHS.items():
+        value: Any = index_stats
+        for key in path.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        values[field] = value or 0
+    return values
 
 
 def init_group(log_name: str) -> Dict[str, Any]:
@@ -293,90 +424,153 @@ def init_group(log_name: str) -> Dict[str, Any]:
         "log_name": log_name,
         "index_count": 0,
         "impact_score": 0.0,
-        "metrics": {
-            "primary_storage_gb": 0.0,
-            "total_storage_gb": 0.0,
-            "doc_count": 0,
-            "total_shards": 0,
-            "total_segments": 0,
-            "segment_memory_mb": 0.0,
-            "fielddata_mb": 0.0,
-            "query_cache_mb": 0.0,
-            "request_cache_mb": 0.0,
-        },
+        "metrics": GroupMetrics(),
         "indices": [],
     }
 
 
-def extract_log_name(match: re.Match, index_name: str) -> str:
-    if "log_name" in match.re.groupindex:
-        name = match.group("log_name")
-    elif match.re.groups >= 1:
-        name = match.group(1)
-    else:
-        name = None
+@functools.lru_cache(maxsize=32)
+def compile_index_pattern(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
 
-    return name if name else index_name
+def log_name_group(index_pattern: re.Pattern) -> Optional[Union[str, int]]:
+    if "log_name" in index_pattern.groupindex:
+        return "log_name"
+    if index_pattern.groups >= 1:
+        return 1
+    return None
 
 
-def group_by_logname(
-    metrics: List[Dict[str, Any]], index_pattern: re.Pattern
+def collect_and_group(
+    stats: Dict[str, Any],
+    settings: Dict[str, Any],
+    data_nodes: int,
+    index_pattern: re.Pattern,
+    fields: FrozenSet[str] = ALL_STAT_FIELDS,
+    allocated_shards: bool = False,
 ) -> Tuple[List[Dict[str, Any]], List[str]]:
     groups: Dict[str, Dict[str, Any]] = {}
     unmatched: List[str] = []
+    match_index = index_pattern.match
+    group_ref = log_name_group(index_pattern)
+    with_primaries = "primary_store_bytes" in fields
+    with_request_cache = "request_cache_bytes" in fields
 
-    for entry in metrics:
-        match = index_pattern.match(entry["name"])
+    for index_name, index_stats in stats.get("indices", {}).items():
+        match = match_index(index_name)
         if not match:
-            unmatched.append(entry["name"])
+            unmatched.append(index_name)
             continue
 
-        log_name = extract_log_name(match, entry["name"])
-        group = groups.setdefault(log_name, init_group(log_name))
-        group["index_count"] += 1
-        group["indices"].append(entry["name"])
+        log_name = index_name if group_ref is None else match.group(group_ref) or index_name
+        group = groups.get(log_name)
+        if group is None:
+            log_name = sys.intern(log_name)
+            group = groups[log_name] = init_group(log_name)
 
-        for key in group["metrics"]:
-            group["metrics"][key] += entry[key]
+        try:
+            total = index_stats["total"]
+            segments = total["segments"]
+            total_store_bytes = total["store"]["size_in_bytes"]
+            total_segments = segments["count"]
+            segment_memory_bytes = segments["memory_in_bytes"]
+            fielddata_bytes = total["fielddata"]["memory_size_in_bytes"]
+            query_cache_bytes = total["query_cache"]["memory_size_in_bytes"]
+            if with_request_cache:
+                request_cache_bytes = total["request_cache"]["memory_size_in_bytes"]
+            else:
+                request_cache_bytes = 0
+            if with_primaries:
+                primaries = index_stats["primaries"]
+                primary_store_bytes = primaries["store"]["size_in_bytes"]
+                doc_count = primaries["docs"]["count"]
+            else:
+                primary_store_bytes = doc_count = 0
+        except (KeyError, TypeError):
+            values = read_index_stats(index_stats)
+            primary_store_bytes = values["primary_store_bytes"]
+            total_store_bytes = values["total_store_bytes"]
+            doc_count = values["doc_count"]
+            total_segments = values["total_segments"]
+            segment_memory_bytes = values["segment_memory_bytes"]
+            fielddata_bytes = values["fielddata_bytes"]
+            query_cache_bytes = values["query_cache_bytes"]
+            request_cache_bytes = values["request_cache_bytes"]
+
+        if allocated_shards:
+            shard_count = sum(map(len, index_stats.get("shards", {}).values()))
+        else:
+            try:
+                settings_index = settings[index_name]["settings"]["index"]
+            except (KeyError, TypeError):
+                settings_index = {}
+            num_shards = to_int(settings_index.get("number_of_shards"))
+            num_replicas = parse_replicas(
+                settings_index.get("number_of_replicas"),
+                settings_index.get("auto_expand_replicas"),
+                data_nodes,
+            )
+            shard_count = num_shards * (1 + num_replicas)
+
+        metrics = group["metrics"]
+        metrics.primary_store_bytes += primary_store_bytes
+        metrics.total_store_bytes += total_store_bytes
+        metrics.doc_count += doc_count
+        metrics.total_shards += shard_count
+        metrics.total_segments += total_segments
+        metrics.segment_memory_bytes += segment_memory_bytes
+        metrics.fielddata_bytes += fielddata_bytes
+        metrics.query_cache_bytes += query_cache_bytes
+        metrics.request_cache_bytes += request_cache_bytes
+        group["index_count"] += 1
+        group["indices"].append(index_name)
 
     return list(groups.values()), unmatched
 
 
-def calculate_weighted_impact(metrics: Dict[str, Any], weights: Dict[str, float]) -> float:
-    return sum(
-        metrics[key] * weights[weight_key] for key, weight_key in WEIGHTED_METRICS.items()
-    )
-
-
-def calculate_capacity_impact(metrics: Dict[str, Any], capacity: Dict[str, float]) -> float:
-    score = 0.0
-    disk_total_gb = capacity.get("disk_total_gb", 0.0)
-    heap_max_mb = capacity.get("heap_max_mb", 0.0)
-
-    if disk_total_gb:
-        score += metrics["total_storage_gb"] / disk_total_gb
-
-    if heap_max_mb:
-        heap_usage_mb = sum(metrics[key] for key in HEAP_USAGE_KEYS)
-        score += heap_usage_mb / heap_max_mb
-
-    return score
+def score_coefficients(
+    score_mode: str, weights: Dict[str, float], capacity: Optional[Dict[str, int]]
+) -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+    if score_mode == "normalized":
+        disk_total_bytes = capacity.get("disk_total_bytes", 0) if capacity else 0
+        heap_max_bytes = capacity.get("heap_max_bytes", 0) if capacity else 0
+        disk_coefficient = 1.0 / disk_total_bytes if disk_total_bytes else 0.0
+        heap_coefficient = 1.0 / heap_max_bytes if heap_max_bytes else 0.0
+        coefficients = {"total_store_bytes": disk_coefficient}
+        coefficients.update((key, heap_coefficient) for key in HEAP_USAGE_KEYS)
+    else:
+        coefficients = {
+            key: weights[weight_key] / unit
+            for key, (weight_key, unit) in WEIGHTED_METRICS.items()
+        }
+    return tuple(coefficients), tuple(coefficients.values())
 
 
 def apply_scoring(
     groups: List[Dict[str, Any]],
     score_mode: str,
     weights: Dict[str, float],
-    capacity: Optional[Dict[str, float]],
-) -> List[Dict[str, Any]]:
-    if score_mode == "normalized":
-        for group in groups:
-            group["impact_score"] = calculate_capacity_impact(group["metrics"], capacity or {})
-    else:
-        for group in groups:
-            group["impact_score"] = calculate_weighted_impact(group["metrics"], weights)
+    capacity: Optional[Dict[str, int]],
+) -> float:
+    keys, coefficients = score_coefficients(score_mode, weights, capacity)
+    read_metrics = operator.attrgetter(*keys)
+    multiply = operator.mul
+
+    scores = []
+    for group in groups:
+        score = sum(map(multiply, read_metrics(group["metrics"]), coefficients))
+        group["impact_score"] = score
+        scores.append(score)
 
-    return sorted(groups, key=lambda g: g["impact_score"], reverse=True)
+    return math.fsum(scores)
+
+
+def rank_groups(groups: List[Dict[str, Any]], top: Optional[int]) -> List[Dict[str, Any]]:
+    key = operator.itemgetter("impact_score")
+    if top:
+        return heapq.nlargest(top, groups, key=key)
+    return sorted(groups, key=key, reverse=True)
 
 
 def render_report(
@@ -385,113 +579,135 @@ def render_report(
     score_mode: str,
     weights: Dict[str, float],
     total_impact: float,
-    capacity: Optional[Dict[str, float]],
+    capacity: Optional[Dict[str, int]],
 ) -> str:
-    lines: List[str] = []
-    lines.append("=" * REPORT_WIDTH)
-    lines.append("ELASTICSEARCH INDEX IMPACT ANALYSIS FOR BILLING")
-    lines.append("=" * REPORT_WIDTH)
-    lines.append("")
+    buf = io.StringIO()
+    write = buf.write
+    write("=" * REPORT_WIDTH + "\n")
+    write("ELASTICSEARCH INDEX IMPACT ANALYSIS FOR BILLING\n")
+    write("=" * REPORT_WIDTH + "\n")
+    write("\n")
     if score_mode == "normalized":
-        lines.append("Scoring mode: normalized (cluster capacity)")
+        write("Scoring mode: normalized (cluster capacity)\n")
         if capacity:
-            lines.append(
+            write(
                 "Cluster totals: "
-                f"disk {capacity.get('disk_total_gb', 0.0):.2f}G, "
-                f"heap {capacity.get('heap_max_mb', 0.0):.0f}MB (data nodes)"
+                f"disk {bytes_to_gb(capacity.get('disk_total_bytes', 0)):.2f}G, "
+                f"heap {bytes_to_mb(capacity.get('heap_max_bytes', 0)):.0f}MB (data nodes)\n"
             )
     else:
-        lines.append("Scoring mode: weighted")
-        lines.append(f"Weights used: {json.dumps(weights, indent=2)}")
-    lines.append("")
-    lines.append(f"Total log groups analyzed: {len(groups)}")
+        write("Scoring mode: weighted\n")
+        write(f"Weights used: {json.dumps(weights, indent=2)}\n")
+    write("\n")
+    write(f"Total log groups analyzed: {len(groups)}\n")
     if score_mode == "normalized":
         matched_share = min(max(total_impact, 0.0), 1.0)
         unmatched_share = max(0.0, 1.0 - matched_share)
-        lines.append(f"Total impact score: {total_impact:.4f}")
-        lines.append(f"Matched indices share of cluster: {matched_share * 100:.2f}%")
-        lines.append(f"Unallocated cluster share: {unmatched_share * 100:.2f}%")
+        write(f"Total impact score: {total_impact:.4f}\n")
+        write(f"Matched indices share of cluster: {matched_share * 100:.2f}%\n")
+        write(f"Unallocated cluster share: {unmatched_share * 100:.2f}%\n")
     else:
-        lines.append(f"Total impact score: {total_impact:.2f}")
-    lines.append("Storage column uses total store size (primaries + replicas).")
-    lines.append("")
-    lines.append("-" * REPORT_WIDTH)
-    lines.append(
-        f"{'Log Name':<{NAME_WIDTH}} {'Impact':>10} {'Storage':>10} {'Shards':>8} {'Indices':>8}"
+        write(f"Total impact score: {total_impact:.2f}\n")
+    write("Storage column uses total store size (primaries + replicas).\n")
+    write("\n")
+    write("-" * REPORT_WIDTH + "\n")
+    write(
+        f"{'Log Name':<{NAME_WIDTH}} {'Impact':>10} {'Storage':>10} {'Shards':>8} {'Indices':>8}\n"
     )
-    lines.append("-" * REPORT_WIDTH)
+    write("-" * REPORT_WIDTH + "\n")
 
-    impact_format = "{:>10.4f}" if score_mode == "normalized" else "{:>10.2f}"
+    row_format = NORMALIZED_ROW_FORMAT if score_mode == "normalized" else WEIGHTED_ROW_FORMAT
+    format_row = row_format.format
     for group in display_groups:
-        storage_display = f"{group['metrics']['total_storage_gb']:.2f}G"
-        lines.append(
-            f"{group['log_name']:<{NAME_WIDTH}}"
-            f" {impact_format.format(group['impact_score'])}"
-            f" {storage_display:>10}"
-            f" {group['metrics']['total_shards']:>8d}"
-            f" {group['index_count']:>8d}"
+        metrics = group["metrics"]
+        write(
+            format_row(
+                group["log_name"],
+                group["impact_score"],
+                f"{bytes_to_gb(metrics.total_store_bytes):.2f}G",
+                metrics.total_shards,
+                group["index_count"],
+            )
         )
 
-    lines.append("")
-    lines.append("=" * REPORT_WIDTH)
-    lines.append("BILLING PERCENTAGE BREAKDOWN")
-    lines.append("=" * REPORT_WIDTH)
-    lines.append("")
-    lines.append(
-        f"{'Log Name':<{NAME_WIDTH}} {'Impact %':>9} {'Estimated Monthly $':>20}"
-    )
-    lines.append("-" * REPORT_WIDTH)
+    write("\n")
+    write("=" * REPORT_WIDTH + "\n")
+    write("BILLING PERCENTAGE BREAKDOWN\n")
+    write("=" * REPORT_WIDTH + "\n")
+    write("\n")
+    write(f"{'Log Name':<{NAME_WIDTH}} {'Impact %':>9} {'Estimated Monthly $':>20}\n")
+    write("-" * REPORT_WIDTH + "\n")
 
-    for group in display_groups:
-        if score_mode == "normalized":
-            impact_pct = group["impact_score"] * 100.0
-            estimated_cost = CLUSTER_COST * group["impact_score"]
-        else:
+    format_breakdown = BREAKDOWN_ROW_FORMAT.format
+    if score_mode == "normalized":
+        for group in display_groups:
+            impact_score = group["impact_score"]
+            write(
+                format_breakdown(
+                    group["log_name"], impact_score * 100.0, CLUSTER_COST * impact_score
+                )
+            )
+    else:
+        for group in display_groups:
             impact_pct = (group["impact_score"] / total_impact * 100.0) if total_impact else 0.0
-            estimated_cost = CLUSTER_COST * (impact_pct / 100.0)
-        lines.append(
-            f"{group['log_name']:<{NAME_WIDTH}}"
-            f" {impact_pct:>8.2f}%"
-            f" {estimated_cost:>20.2f}"
-        )
+            write(
+                format_breakdown(
+                    group["log_name"], impact_pct, CLUSTER_COST * (impact_pct / 100.0)
+                )
+            )
 
-    lines.append("...")
-    lines.append(f"(Based on example cluster cost of ${CLUSTER_COST:.0f}/month)")
-    return "\n".join(lines)
+    write("...\n")
+    write(f"(Based on example cluster cost of ${CLUSTER_COST:.0f}/month)")
+    return buf.getvalue()
 
 
-def build_json_output(display_groups: List[Dict[str, Any]]) -> str:
+def build_json_output(display_groups: List[Dict[str, Any]]) -> bytes:
     payload = []
     for group in display_groups:
+        metrics = group["metrics"]
         payload.append(
             {
                 "log_name": group["log_name"],
                 "index_count": group["index_count"],
                 "impact_score": round(group["impact_score"], 6),
                 "metrics": {
-                    "primary_storage_gb": round(group["metrics"]["primary_storage_gb"], 3),
-                    "total_storage_gb": round(group["metrics"]["total_storage_gb"], 3),
-                    "doc_count": int(group["metrics"]["doc_count"]),
-                    "total_shards": int(group["metrics"]["total_shards"]),
-                    "total_segments": int(group["metrics"]["total_segments"]),
-                    "segment_memory_mb": round(group["metrics"]["segment_memory_mb"], 2),
-                    "fielddata_mb": round(group["metrics"]["fielddata_mb"], 2),
-                    "query_cache_mb": round(group["metrics"]["query_cache_mb"], 2),
-                    "request_cache_mb": round(group["metrics"]["request_cache_mb"], 2),
+                    "primary_storage_gb": round(bytes_to_gb(metrics.primary_store_bytes), 3),
+                    "total_storage_gb": round(bytes_to_gb(metrics.total_store_bytes), 3),
+                    "doc_count": int(metrics.doc_count),
+                    "total_shards": int(metrics.total_shards),
+                    "total_segments": int(metrics.total_segments),
+                    "segment_memory_mb": round(bytes_to_mb(metrics.segment_memory_bytes), 2),
+                    "fielddata_mb": round(bytes_to_mb(metrics.fielddata_bytes), 2),
+                    "query_cache_mb": round(bytes_to_mb(metrics.query_cache_bytes), 2),
+                    "request_cache_mb": round(bytes_to_mb(metrics.request_cache_bytes), 2),
                 },
                 "indices": group["indices"],
             }
         )
-    return json.dumps(payload, indent=2)
+    return encode_json(payload)
 
 
-def write_output(content: str, output_path: Optional[str], is_json: bool) -> None:
+def write_output(
+    content: Union[str, bytes], output_path: Optional[str], is_json: bool
+) -> None:
     if output_path:
-        with open(output_path, "w", encoding="utf-8") as handle:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        with open(output_path, "wb") as handle:
             handle.write(content)
         label = "JSON report" if is_json else "report"
         print(f"Wrote {label} to {output_path}", file=sys.stderr)
+        return
+
+    buffer = getattr(sys.stdout, "buffer", None)
+    if isinstance(content, bytes) and buffer is not None:
+        sys.stdout.flush()
+        buffer.write(content)
+        buffer.write(b"\n")
+        buffer.flush()
     else:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
         print(content)
 
 
@@ -514,43 +730,63 @@ def main() -> int:
     base_url = f"{scheme}://{args.host}:{args.port}"
 
     session = requests.Session()
+    configure_session(session)
     verify = not args.insecure
     if args.user and args.password:
         session.auth = (args.user, args.password)
     if args.insecure:
         apply_insecure_tls(session)
 
-    try:
-        stats = request_json(
-            session,
-            f"{base_url}/_stats",
-            params={
-                "metric": "store,docs,segments,fielddata,query_cache,request_cache",
-                "level": "indices",
-            },
-            verify=verify,
-        )
-        settings = request_json(
-            session,
-            f"{base_url}/_settings",
-            params={
-                "filter_path": (
-                    "**.settings.index.number_of_shards,"
-                    "**.settings.index.number_of_replicas,"
-                    "**.settings.index.auto_expand_replicas"
+    stat_fields = required_stat_fields(args.score_mode, args.json)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = {
+            executor.submit(
+                request_json,
+                session,
+                f"{base_url}/_stats",
+                params=index_stats_params(stat_fields, args.allocated_shards),
+                verify=verify,
+            ): "_stats",
+        }
+        if not args.allocated_shards:
+            futures[
+                executor.submit(
+                    request_json,
+                    session,
+                    f"{base_url}/_settings",
+                    params={
+                        "filter_path": (
+                            "*.settings.index.number_of_shards,"
+                            "*.settings.index.number_of_replicas,"
+                            "*.settings.index.auto_expand_replicas"
+                        )
+                    },
+                    verify=verify,
                 )
-            },
-            verify=verify,
-        )
-    except requests.RequestException as exc:
-        print(f"Failed to fetch data from {base_url}: {exc}", file=sys.stderr)
-        return 1
+            ] = "_settings"
+        # Node stats are only needed in weighted mode when replicas auto-expand,
+        # which is not known until _settings returns; fetch them speculatively.
+        cluster_future = None
+        if args.score_mode == "normalized" or not args.allocated_shards:
+            cluster_future = executor.submit(fetch_cluster_info, session, base_url, verify)
+
+        responses: Dict[str, Dict[str, Any]] = {}
+        for future in as_completed(futures):
+            endpoint = futures[future]
+            try:
+                responses[endpoint] = future.result()
+            except requests.RequestException as exc:
+                print(f"Failed to fetch {endpoint} from {base_url}: {exc}", file=sys.stderr)
+                return 1
+
+    stats = responses["_stats"]
+    settings = responses.get("_settings", {})
 
-    cluster_info: Optional[Dict[str, float]] = None
+    cluster_info: Optional[Dict[str, int]] = None
     needs_cluster_info = args.score_mode == "normalized" or needs_data_nodes(settings)
-    if needs_cluster_info:
+    if cluster_future is not None and needs_cluster_info:
         try:
-            cluster_info = fetch_cluster_info(session, base_url, verify)
+            cluster_info = cluster_future.result()
         except requests.RequestException as exc:
             if args.score_mode == "normalized":
                 print(
@@ -570,8 +806,8 @@ def main() -> int:
     data_nodes = int(cluster_info.get("data_nodes", 0)) if cluster_info else 0
 
     if args.score_mode == "normalized":
-        disk_total = cluster_info.get("disk_total_gb", 0.0) if cluster_info else 0.0
-        heap_total = cluster_info.get("heap_max_mb", 0.0) if cluster_info else 0.0
+        disk_total = cluster_info.get("disk_total_bytes", 0) if cluster_info else 0
+        heap_total = cluster_info.get("heap_max_bytes", 0) if cluster_info else 0
         if not disk_total and not heap_total:
             print(
                 "Cluster capacity totals are unavailable; normalized scoring requires node stats.",
@@ -591,9 +827,8 @@ def main() -> int:
                 file=sys.stderr,
             )
 
-    index_metrics = collect_index_metrics(stats, settings, data_nodes)
     try:
-        index_pattern = re.compile(args.index_pattern)
+        index_pattern = compile_index_pattern(args.index_pattern)
     except re.error as exc:
         print(f"Invalid --index-pattern: {exc}", file=sys.stderr)
         return 2
@@ -604,7 +839,9 @@ def main() -> int:
             file=sys.stderr,
         )
 
-    groups, unmatched = group_by_logname(index_metrics, index_pattern)
+    groups, unmatched = collect_and_group(
+        stats, settings, data_nodes, index_pattern, stat_fields, args.allocated_shards
+    )
 
     if unmatched:
         print(
@@ -616,10 +853,8 @@ def main() -> int:
         print("No indices matched the expected pattern.", file=sys.stderr)
         return 1
 
-    groups = apply_scoring(groups, args.score_mode, weights, cluster_info)
-
-    display_groups = groups[: args.top] if args.top else groups
-    total_impact = sum(group["impact_score"] for group in groups)
+    total_impact = apply_scoring(groups, args.score_mode, weights, cluster_info)
+    display_groups = rank_groups(groups, args.top)
 
     if args.json:
         output = build_json_output(display_groups)
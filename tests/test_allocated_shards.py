@@ -0,0 +1,117 @@
+import json
+import sys
+
+import pytest
+
+import es_index_impact_analyzer as analyzer
+
+
+def index_stats(store_bytes, shards=None):
+    stats = {
+        "primaries": {"store": {"size_in_bytes": store_bytes // 2}, "docs": {"count": 10}},
+        "total": {
+            "store": {"size_in_bytes": store_bytes},
+            "segments": {"count": 4, "memory_in_bytes": 1024},
+            "fielddata": {"memory_size_in_bytes": 2048},
+            "query_cache": {"memory_size_in_bytes": 512},
+            "request_cache": {"memory_size_in_bytes": 256},
+        },
+    }
+    if shards is not None:
+        stats["shards"] = shards
+    return stats
+
+
+def shard_copies(count):
+    return [{"routing": {"primary": copy == 0}} for copy in range(count)]
+
+
+STATS = {
+    "indices": {
+        "logstash-app-000001": index_stats(
+            4 * analyzer.BYTES_PER_GB,
+            {"0": shard_copies(2), "1": shard_copies(2)},
+        ),
+        "logstash-app-000002": index_stats(analyzer.BYTES_PER_GB, {"0": shard_copies(1)}),
+        "logstash-other-000001": index_stats(analyzer.BYTES_PER_GB),
+    }
+}
+
+NODE_STATS = {
+    "nodes": {
+        "node-1": {
+            "roles": ["data", "master"],
+            "jvm": {"mem": {"heap_max_in_bytes": 8 * analyzer.BYTES_PER_GB}},
+            "fs": {"total": {"total_in_bytes": 100 * analyzer.BYTES_PER_GB}},
+        }
+    }
+}
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    urls = []
+
+    def fake_request_json(session, url, params, verify):
+        urls.append(url)
+        if url.endswith("/_stats"):
+            assert params["level"] == "shards"
+            return STATS
+        if url.endswith("/_nodes/stats/jvm,fs"):
+            return NODE_STATS
+        raise AssertionError(f"unexpected request to {url}")
+
+    monkeypatch.setattr(analyzer, "request_json", fake_request_json)
+    return urls
+
+
+def run_main(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, "argv", ["es_index_impact_analyzer.py", *argv])
+    assert analyzer.main() == 0
+    return {group["log_name"]: group for group in json.loads(capsys.readouterr().out)}
+
+
+def test_index_stats_params_requests_shard_level_routing():
+    params = analyzer.index_stats_params(analyzer.ALL_STAT_FIELDS, allocated_shards=True)
+    assert params["level"] == "shards"
+    assert "indices.*.shards.*.routing.primary" in params["filter_path"].split(",")
+
+    params = analyzer.index_stats_params(analyzer.ALL_STAT_FIELDS)
+    assert params["level"] == "indices"
+    assert "shards" not in params["filter_path"]
+
+
+def test_collect_and_group_counts_allocated_copies():
+    groups, unmatched = analyzer.collect_and_group(
+        STATS,
+        {},
+        0,
+        analyzer.compile_index_pattern(analyzer.DEFAULT_INDEX_PATTERN),
+        allocated_shards=True,
+    )
+    by_name = {group["log_name"]: group for group in groups}
+
+    assert unmatched == []
+    assert by_name["app"]["metrics"].total_shards == 5
+    assert by_name["other"]["metrics"].total_shards == 0
+
+
+def test_weighted_mode_skips_settings_and_node_stats(monkeypatch, capsys, requested):
+    groups = run_main(
+        monkeypatch, capsys, "--allocated-shards", "--score-mode", "weighted", "--json"
+    )
+
+    assert requested == ["http://localhost:9200/_stats"]
+    assert groups["app"]["metrics"]["total_shards"] == 5
+    assert groups["other"]["metrics"]["total_shards"] == 0
+
+
+def test_normalized_mode_skips_settings(monkeypatch, capsys, requested):
+    groups = run_main(monkeypatch, capsys, "--allocated-shards", "--json")
+
+    assert sorted(requested) == [
+        "http://localhost:9200/_nodes/stats/jvm,fs",
+        "http://localhost:9200/_stats",
+    ]
+    assert groups["app"]["metrics"]["total_shards"] == 5
+    assert groups["other"]["metrics"]["total_shards"] == 0